@@ -1,10 +1,31 @@
 import logging
 import argparse
+import time
+from contextlib import contextmanager
+from typing import Optional
+
 from psycopg2 import connect, sql
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Advisory lock key shared by every process that rebuilds the statistics table,
+# so only one rebuild can run cluster-wide at a time.
+ADVISORY_LOCK_KEY = 7_204_113_001
+
+# Rough memory needed to sort one job posting row in the statistics statement.
+SORT_BYTES_PER_ROW = 128
+MIN_WORK_MEM_MB = 64
+
+
+@contextmanager
+def _measure(timings: dict[str, float], phase: str):
+    started_at = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[phase] = time.monotonic() - started_at
+
 
 class CalculateDaysToHireJob:
 
@@ -15,12 +36,16 @@ class CalculateDaysToHireJob:
         rds_db_password: str,
         rds_host: str,
         rds_port: str,
+        max_work_mem_mb: int = 1024,
+        parallel_maintenance_workers: int = 2,
     ) -> None:
         self._rds_db_name = rds_db_name
         self._rds_db_username = rds_db_username
         self._rds_db_password = rds_db_password
         self._rds_host = rds_host
         self._rds_port = rds_port
+        self._max_work_mem_mb = max_work_mem_mb
+        self._parallel_maintenance_workers = parallel_maintenance_workers
 
     @staticmethod
     def __get_temp_table_name(table_name: str) -> str:
@@ -36,11 +61,94 @@ class CalculateDaysToHireJob:
         )
 
     def _get_sql_to_create_temp_table(self, table_name: str) -> sql.SQL:
-        return sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING ALL);").format(
+        # Unlogged and without indexes, so the bulk insert writes neither WAL
+        # nor index entries row by row. Indexes are built after the load.
+        return sql.SQL(
+            "CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING ALL EXCLUDING INDEXES);"
+        ).format(
             sql.Identifier(self.__get_temp_table_name(table_name)),
             sql.Identifier(table_name),
         )
 
+    def _get_sql_to_set_temp_table_logged(self, table_name: str) -> sql.SQL:
+        return sql.SQL("ALTER TABLE {} SET LOGGED;").format(
+            sql.Identifier(self.__get_temp_table_name(table_name)),
+        )
+
+    def _get_sqls_to_create_temp_table_indexes(
+        self, cursor, table_name: str
+    ) -> list[sql.SQL]:
+        """Copy constraints backed by indexes and plain indexes of the table to
+        its temp table, letting Postgres pick names that do not clash."""
+        temp_table = sql.Identifier(self.__get_temp_table_name(table_name))
+        cursor.execute(
+            """
+            SELECT pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'x')
+            ORDER BY contype, conname
+            """,
+            (table_name,),
+        )
+        sqls = [
+            sql.SQL("ALTER TABLE {} ADD {};").format(temp_table, sql.SQL(definition))
+            for (definition,) in cursor.fetchall()
+        ]
+        cursor.execute(
+            """
+            SELECT i.indisunique, substring(pg_get_indexdef(i.indexrelid) FROM ' USING .*$')
+            FROM pg_index i
+            WHERE i.indrelid = to_regclass(%s)
+                AND NOT EXISTS (
+                    SELECT 1 FROM pg_constraint c
+                    WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid
+                )
+            ORDER BY i.indexrelid
+            """,
+            (table_name,),
+        )
+        sqls += [
+            sql.SQL("CREATE {} ON {}{};").format(
+                sql.SQL("UNIQUE INDEX" if is_unique else "INDEX"),
+                temp_table,
+                sql.SQL(definition),
+            )
+            for is_unique, definition in cursor.fetchall()
+        ]
+        return sqls
+
+    def _get_sql_to_analyze_temp_table(self, table_name: str) -> sql.SQL:
+        return sql.SQL("ANALYZE {};").format(
+            sql.Identifier(self.__get_temp_table_name(table_name)),
+        )
+
+    @staticmethod
+    def _get_estimated_rows_number(cursor, table_name: str) -> int:
+        cursor.execute(
+            "SELECT GREATEST(reltuples, 0)::BIGINT FROM pg_class WHERE oid = %s::regclass",
+            (table_name,),
+        )
+        return cursor.fetchone()[0]
+
+    def _get_sql_to_set_resources(self, estimated_rows_number: int) -> sql.SQL:
+        """Session settings for this transaction, sized from the rows number
+        the largest single statistics statement has to sort."""
+        work_mem_mb = min(
+            max(estimated_rows_number * SORT_BYTES_PER_ROW // 2**20, MIN_WORK_MEM_MB),
+            self._max_work_mem_mb,
+        )
+        return sql.SQL(
+            """
+            SET LOCAL work_mem = {};
+            SET LOCAL maintenance_work_mem = {};
+            SET LOCAL max_parallel_maintenance_workers = {};
+            """
+        ).format(
+            sql.Literal(f"{work_mem_mb}MB"),
+            sql.Literal(f"{work_mem_mb}MB"),
+            sql.Literal(self._parallel_maintenance_workers),
+        )
+
     @staticmethod
     def _build_base_data_table(job_posting_table_name: str) -> sql.SQL:
         return sql.SQL(
@@ -70,6 +178,12 @@ class CalculateDaysToHireJob:
             )
 
         _group_by = sql.SQL(",".join(dimensions))
+        # Percentiles are joined on every dimension, so rows of a standard job
+        # are trimmed by the percentiles of their own country only.
+        _join_on = sql.SQL(" AND ").join(
+            sql.SQL("b.{0} = p.{0}").format(sql.Identifier(dimension))
+            for dimension in dimensions
+        )
         percentiles_table_name = sql.SQL(f'percentiles_{"_".join(dimensions)}')
         filtered_table_name = sql.SQL(f'filtered_{"_".join(dimensions)}')
         aggregated_table_name = sql.SQL(f'aggregated_{"_".join(dimensions)}')
@@ -77,7 +191,7 @@ class CalculateDaysToHireJob:
             """
             {} AS (
                 SELECT
-                    standard_job_id,
+                    {},
                     PERCENTILE_CONT(0.1) WITHIN GROUP (ORDER BY days_to_hire) AS p10,
                     PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY days_to_hire) AS p90
                 FROM base_data
@@ -91,7 +205,7 @@ class CalculateDaysToHireJob:
                     p.p10 as min_days,
                     p.p90 as max_days
                 FROM base_data b
-                JOIN {} p ON b.standard_job_id = p.standard_job_id
+                JOIN {} p ON {}
                 WHERE b.days_to_hire > p.p10 AND b.days_to_hire < p.p90 {}
             ),
             {} AS (
@@ -108,8 +222,10 @@ class CalculateDaysToHireJob:
         ).format(
             percentiles_table_name,
             _group_by,
+            _group_by,
             filtered_table_name,
             percentiles_table_name,
+            _join_on,
             additional_filters_before_aggregation,
             aggregated_table_name,
             _group_by,
@@ -140,7 +256,9 @@ class CalculateDaysToHireJob:
         )
 
     @staticmethod
-    def _build_inserting_sql(table_name: str, job_posting_min: int) -> sql.SQL:
+    def _build_inserting_sql(
+        table_name: str, job_posting_min: int, id_offset: int = 0
+    ) -> sql.SQL:
         return sql.SQL(
             """
             INSERT INTO {} (
@@ -153,7 +271,7 @@ class CalculateDaysToHireJob:
                     max_days
                 )
                 SELECT 
-                    ROW_NUMBER() OVER () AS id,
+                    {} + ROW_NUMBER() OVER () AS id,
                     standard_job_id,
                     country_code,
                     job_postings_number,
@@ -165,6 +283,7 @@ class CalculateDaysToHireJob:
             """
         ).format(
             sql.Identifier(table_name),
+            sql.Literal(id_offset),
             sql.Literal(job_posting_min),
         )
 
@@ -173,6 +292,7 @@ class CalculateDaysToHireJob:
         table_name: str,
         job_posting_table_name: str = "job_posting",
         job_posting_min: int = 5,
+        id_offset: int = 0,
     ) -> sql.SQL:
 
         base_data_sql = self._build_base_data_table(job_posting_table_name)
@@ -184,7 +304,7 @@ class CalculateDaysToHireJob:
             country_aggregated_table_name, world_aggregated_table_name
         )
         inserting_sql = self._build_inserting_sql(
-            self.__get_temp_table_name(table_name), job_posting_min
+            self.__get_temp_table_name(table_name), job_posting_min, id_offset
         )
         _sql = sql.SQL(
             """
@@ -211,41 +331,164 @@ class CalculateDaysToHireJob:
             sql.Identifier(table_name),
         )
 
-    def run(
+    @staticmethod
+    def _get_sql_to_publish_snapshot(table_name: str, rows_number: int) -> sql.SQL:
+        return sql.SQL(
+            "INSERT INTO days_to_hire_snapshot (table_name, rows_number) VALUES ({}, {});"
+        ).format(
+            sql.Literal(table_name),
+            sql.Literal(rows_number),
+        )
+
+    @staticmethod
+    def _get_partitions(cursor, job_posting_table_name: str) -> list[tuple[str, int]]:
+        """Partition names with their estimated rows number, empty for a plain table."""
+        cursor.execute(
+            """
+            SELECT c.relname, GREATEST(c.reltuples, 0)::BIGINT
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            ORDER BY c.relname
+            """,
+            (job_posting_table_name,),
+        )
+        return cursor.fetchall()
+
+    def _process_partitions(
         self,
+        cursor,
+        table_name: str,
+        job_posting_table_name: str,
+        job_posting_min: int,
+        partitions: list[tuple[str, int]],
+    ) -> int:
+        """Calculate statistics partition by partition and return saved rows number.
+
+        Job postings are partitioned by standard_job_id, so each partition holds
+        every row of its standard jobs and percentiles can be computed per
+        partition, with each sort limited to the partition size.
+        """
+        if not partitions:
+            cursor.execute(
+                self._get_sql_to_processing_days_to_hire_calculation(
+                    table_name, job_posting_table_name, job_posting_min
+                )
+            )
+            return cursor.rowcount
+
+        rows_number = 0
+        for partition_name, estimated_rows_number in partitions:
+            started_at = time.monotonic()
+            cursor.execute(
+                self._get_sql_to_processing_days_to_hire_calculation(
+                    table_name, partition_name, job_posting_min, rows_number
+                )
+            )
+            rows_number += cursor.rowcount
+            logger.info(
+                f"Partition {partition_name}: ~{estimated_rows_number} job postings, "
+                f"{cursor.rowcount} statistics rows in {time.monotonic() - started_at:.3f}s."
+            )
+        return rows_number
+
+    def _try_acquire_run_lock(self, cursor) -> bool:
+        cursor.execute(
+            sql.SQL("SELECT pg_try_advisory_xact_lock({});").format(
+                sql.Literal(ADVISORY_LOCK_KEY)
+            )
+        )
+        return cursor.fetchone()[0]
+
+    def execute(
+        self,
+        connection,
         table_name: str = "days_to_hire",
         job_posting_table_name: str = "job_posting",
-        job_posting_min: str = 5,
-    ):
-        connection = self._get_psycopg2_db_connection()
-        connection.autocommit = False
+        job_posting_min: int = 5,
+    ) -> Optional[int]:
+        """Rebuild the statistics table in one transaction on the given connection.
 
+        The temp table is loaded unlogged and without indexes, then made
+        durable, indexed, analyzed and swapped in. Returns the number of saved
+        rows, or None if another process is already rebuilding the table.
+        """
         create_temp_table_sql = self._get_sql_to_create_temp_table(table_name)
-        processing_sql = self._get_sql_to_processing_days_to_hire_calculation(
-            table_name, job_posting_table_name, job_posting_min
-        )
+        set_temp_table_logged_sql = self._get_sql_to_set_temp_table_logged(table_name)
+        analyze_temp_table_sql = self._get_sql_to_analyze_temp_table(table_name)
         delete_old_table_sql = self._get_sql_to_drop_old_table(table_name)
         rename_new_table_sql = self._get_sql_to_rename_new_table(table_name)
+        timings = {}
+
+        with connection.cursor() as cursor:
+            if not self._try_acquire_run_lock(cursor):
+                connection.rollback()
+                logger.warning("Another days to hire calculation is running, skipping.")
+                return None
+            with _measure(timings, "prepare"):
+                partitions = self._get_partitions(cursor, job_posting_table_name)
+                estimated_rows_number = (
+                    max(rows for _, rows in partitions)
+                    if partitions
+                    else self._get_estimated_rows_number(cursor, job_posting_table_name)
+                )
+                cursor.execute(self._get_sql_to_set_resources(estimated_rows_number))
+                create_indexes_sqls = self._get_sqls_to_create_temp_table_indexes(
+                    cursor, table_name
+                )
+                cursor.execute(create_temp_table_sql)
+            with _measure(timings, "load"):
+                rows_number = self._process_partitions(
+                    cursor,
+                    table_name,
+                    job_posting_table_name,
+                    job_posting_min,
+                    partitions,
+                )
+            # Logged before indexing, SET LOGGED would otherwise rebuild the indexes.
+            with _measure(timings, "set_logged"):
+                cursor.execute(set_temp_table_logged_sql)
+            with _measure(timings, "create_indexes"):
+                for create_index_sql in create_indexes_sqls:
+                    cursor.execute(create_index_sql)
+            with _measure(timings, "analyze"):
+                cursor.execute(analyze_temp_table_sql)
+            with _measure(timings, "publish"):
+                cursor.execute(delete_old_table_sql)
+                cursor.execute(rename_new_table_sql)
+                cursor.execute(
+                    self._get_sql_to_publish_snapshot(table_name, rows_number)
+                )
+        with _measure(timings, "commit"):
+            connection.commit()
+        logger.info(
+            "Days to hire phases: "
+            + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+        )
+        return rows_number
+
+    def run(
+        self,
+        table_name: str = "days_to_hire",
+        job_posting_table_name: str = "job_posting",
+        job_posting_min: str = 5,
+    ) -> Optional[int]:
+        connection = self._get_psycopg2_db_connection()
+        connection.autocommit = False
 
-        cursor = connection.cursor()
         try:
-            cursor.execute(create_temp_table_sql)
-            cursor.execute(processing_sql)
-            cursor.execute(delete_old_table_sql)
-            cursor.execute(rename_new_table_sql)
-            connection.commit()
+            return self.execute(
+                connection, table_name, job_posting_table_name, job_posting_min
+            )
         except Exception as e:
             connection.rollback()
             logger.error(e, exc_info=True)
-            cursor.close()
-            connection.close()
             raise
         finally:
-            cursor.close()
             connection.close()
 
 
-def parse_args():
+def build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Process and store job posting statistics."
     )
@@ -305,10 +548,29 @@ def parse_args():
         default="5432",
         help="Database port",
     )
-    return parser.parse_args()
+
+    parser.add_argument(
+        "--max_work_mem_mb",
+        type=int,
+        default=1024,
+        help="Upper bound for work_mem sized from the estimated job postings number, in MB. (default: 1024)",
+    )
+
+    parser.add_argument(
+        "--parallel_maintenance_workers",
+        type=int,
+        default=2,
+        help="Parallel workers for building indexes of the new table. (default: 2)",
+    )
+    return parser
+
+
+def parse_args():
+    return build_arg_parser().parse_args()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     args = parse_args()
 
     CalculateDaysToHireJob(
@@ -317,6 +579,8 @@ if __name__ == "__main__":
         args.rds_db_password,
         args.rds_host,
         args.rds_port,
+        args.max_work_mem_mb,
+        args.parallel_maintenance_workers,
     ).run(
         args.save_to_table_name,
         args.job_posting_table_name,
@@ -0,0 +1,368 @@
+import json
+import logging
+import select
+import signal
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from psycopg2 import InterfaceError, OperationalError, sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from cli.calculate_days_to_hire import (
+    ADVISORY_LOCK_KEY,
+    CalculateDaysToHireJob,
+    build_arg_parser,
+)
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+@dataclass
+class SchedulerStatus:
+    is_leader: bool = False
+    is_running: bool = False
+    pending_changes: int = 0
+    runs_number: int = 0
+    failures_number: int = 0
+    last_trigger: Optional[str] = None
+    last_run_started_at: Optional[float] = None
+    last_run_finished_at: Optional[float] = None
+    last_run_duration_seconds: Optional[float] = None
+    last_run_rows_number: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+class DaysToHireScheduler:
+    """Keeps database connections warm and rebuilds "days to hire" statistics
+    on a schedule or once enough job postings have changed.
+
+    Only the instance holding the session advisory lock runs the job, the
+    others stay on standby and retry the lock on every poll.
+    """
+
+    def __init__(
+        self,
+        job: CalculateDaysToHireJob,
+        table_name: str = "days_to_hire",
+        job_posting_table_name: str = "job_posting",
+        job_posting_min: int = 5,
+        interval_seconds: int = 3600,
+        change_threshold: int = 0,
+        notify_channel: Optional[str] = None,
+        poll_seconds: float = 5.0,
+        retry_seconds: float = 60.0,
+    ) -> None:
+        self._job = job
+        self._table_name = table_name
+        self._job_posting_table_name = job_posting_table_name
+        self._job_posting_min = job_posting_min
+        self._interval_seconds = interval_seconds
+        self._change_threshold = change_threshold
+        self._notify_channel = notify_channel
+        self._poll_seconds = poll_seconds
+        self._retry_seconds = retry_seconds
+
+        self._connection = None
+        self._listen_connection = None
+        self._watermark: Optional[int] = None
+        self._notified_changes = 0
+        self._next_run_at = time.monotonic()
+        self._retry_at = time.monotonic()
+        self._stop_event = threading.Event()
+        self._status = SchedulerStatus()
+        self._status_lock = threading.Lock()
+
+    def get_status(self) -> SchedulerStatus:
+        with self._status_lock:
+            return replace(self._status)
+
+    def _update_status(self, **changes) -> None:
+        with self._status_lock:
+            self._status = replace(self._status, **changes)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _connect(self) -> None:
+        if self._connection is None or self._connection.closed:
+            self._connection = self._job._get_psycopg2_db_connection()
+            self._connection.autocommit = False
+
+    def _listen(self) -> None:
+        # Only the leader listens, a standby would never drain its notifications.
+        if self._notify_channel and (
+            self._listen_connection is None or self._listen_connection.closed
+        ):
+            self._listen_connection = self._job._get_psycopg2_db_connection()
+            self._listen_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with self._listen_connection.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("LISTEN {};").format(sql.Identifier(self._notify_channel))
+                )
+
+    def _disconnect(self) -> None:
+        for connection in (self._connection, self._listen_connection):
+            if connection is not None and not connection.closed:
+                connection.close()
+        self._connection = None
+        self._listen_connection = None
+        self._update_status(is_leader=False, is_running=False)
+
+    def _try_become_leader(self) -> bool:
+        if self.get_status().is_leader:
+            return True
+        with self._connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("SELECT pg_try_advisory_lock({});").format(
+                    sql.Literal(ADVISORY_LOCK_KEY)
+                )
+            )
+            is_leader = cursor.fetchone()[0]
+        self._connection.commit()
+        if is_leader:
+            logger.info("Acquired days to hire advisory lock, running as leader.")
+        self._update_status(is_leader=is_leader)
+        return is_leader
+
+    def _get_modifications_number(self) -> int:
+        """Cumulative inserted, updated and deleted rows of the job posting
+        table and its partitions, as tracked by the statistics collector."""
+        with self._connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+                FROM pg_stat_user_tables
+                WHERE relid = %(table_name)s::regclass
+                   OR relid IN (
+                       SELECT inhrelid FROM pg_inherits
+                       WHERE inhparent = %(table_name)s::regclass
+                   )
+                """,
+                {"table_name": self._job_posting_table_name},
+            )
+            modifications_number = int(cursor.fetchone()[0])
+        self._connection.commit()
+        return modifications_number
+
+    def _drain_notifications(self) -> None:
+        if self._listen_connection is None:
+            return
+        self._listen_connection.poll()
+        while self._listen_connection.notifies:
+            notify = self._listen_connection.notifies.pop(0)
+            self._notified_changes += (
+                int(notify.payload) if notify.payload.isdigit() else 1
+            )
+
+    def _get_pending_changes(self, modifications_number: int) -> int:
+        # Counters go backwards after a statistics reset, start over from there.
+        if self._watermark is None or modifications_number < self._watermark:
+            self._watermark = modifications_number
+        return max(modifications_number - self._watermark, self._notified_changes)
+
+    def _get_trigger(self, pending_changes: int) -> Optional[str]:
+        if time.monotonic() < self._retry_at:
+            return None
+        if time.monotonic() >= self._next_run_at:
+            return "schedule"
+        if self._change_threshold and pending_changes >= self._change_threshold:
+            return "changes"
+        return None
+
+    def _run_job(self, trigger: str, modifications_number: int) -> None:
+        started_at = time.time()
+        self._update_status(
+            is_running=True, last_trigger=trigger, last_run_started_at=started_at
+        )
+        notified_changes = self._notified_changes
+        scheduled_at = time.monotonic()
+
+        logger.info(f"Running days to hire calculation, trigger: {trigger}.")
+        try:
+            rows_number = self._job.execute(
+                self._connection,
+                self._table_name,
+                self._job_posting_table_name,
+                self._job_posting_min,
+            )
+        except Exception as e:
+            # Pending changes and the schedule are kept, the run is retried soon.
+            self._retry_at = time.monotonic() + self._retry_seconds
+            if not self._connection.closed:
+                self._connection.rollback()
+            logger.error(e, exc_info=True)
+            status = self.get_status()
+            self._update_status(
+                is_running=False,
+                failures_number=status.failures_number + 1,
+                last_error=str(e),
+            )
+            if isinstance(e, (OperationalError, InterfaceError)):
+                raise
+            return
+
+        # Changes arriving while the job ran are counted from its start, so any
+        # number of triggers during a run coalesce into one next run.
+        self._watermark = modifications_number
+        self._notified_changes -= notified_changes
+        self._next_run_at = scheduled_at + self._interval_seconds
+
+        finished_at = time.time()
+        status = self.get_status()
+        self._update_status(
+            is_running=False,
+            runs_number=status.runs_number + 1,
+            last_run_finished_at=finished_at,
+            last_run_duration_seconds=finished_at - started_at,
+            last_run_rows_number=rows_number,
+            last_error=None,
+        )
+        logger.info(
+            f"Days to hire calculation finished in {finished_at - started_at:.2f}s, "
+            f"rows: {rows_number}."
+        )
+
+    def _wait(self) -> None:
+        if self._listen_connection is None:
+            self._stop_event.wait(self._poll_seconds)
+            return
+        select.select([self._listen_connection], [], [], self._poll_seconds)
+
+    def _tick(self) -> None:
+        self._connect()
+        if not self._try_become_leader():
+            return
+        self._listen()
+        self._drain_notifications()
+        modifications_number = self._get_modifications_number()
+        pending_changes = self._get_pending_changes(modifications_number)
+        self._update_status(pending_changes=pending_changes)
+
+        trigger = self._get_trigger(pending_changes)
+        if trigger is not None:
+            self._run_job(trigger, modifications_number)
+
+    def serve_forever(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self._tick()
+                except (OperationalError, InterfaceError) as e:
+                    logger.error(e, exc_info=True)
+                    self._disconnect()
+                self._wait()
+        finally:
+            self._disconnect()
+
+
+def build_health_server(
+    scheduler: DaysToHireScheduler, host: str, port: int
+) -> ThreadingHTTPServer:
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != "/health":
+                self.send_error(404, "Not found")
+                return
+            body = json.dumps(asdict(scheduler.get_status())).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            logger.debug(format, *args)
+
+    return ThreadingHTTPServer((host, port), HealthHandler)
+
+
+def parse_args():
+    parser = build_arg_parser()
+
+    parser.add_argument(
+        "--interval_seconds",
+        type=int,
+        default=3600,
+        help="Seconds between scheduled recalculations. (default: 3600)",
+    )
+
+    parser.add_argument(
+        "--change_threshold",
+        type=int,
+        default=0,
+        help="Number of changed job postings that triggers a recalculation before the schedule, 0 disables it. (default: 0)",
+    )
+
+    parser.add_argument(
+        "--notify_channel",
+        type=str,
+        default=None,
+        help="Channel to LISTEN on for job posting changes. A numeric payload is counted as the number of changed rows, any other as one. (default: disabled)",
+    )
+
+    parser.add_argument(
+        "--poll_seconds",
+        type=float,
+        default=5.0,
+        help="Seconds between checks of the schedule, changes and advisory lock. (default: 5)",
+    )
+
+    parser.add_argument(
+        "--retry_seconds",
+        type=float,
+        default=60.0,
+        help="Seconds to wait before retrying a failed recalculation. (default: 60)",
+    )
+
+    parser.add_argument(
+        "--health_host",
+        type=str,
+        default="0.0.0.0",
+        help="Host for the health endpoint. (default: 0.0.0.0)",
+    )
+
+    parser.add_argument(
+        "--health_port",
+        type=int,
+        default=8081,
+        help="Port for the health endpoint. (default: 8081)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    scheduler = DaysToHireScheduler(
+        CalculateDaysToHireJob(
+            args.rds_db_name,
+            args.rds_db_username,
+            args.rds_db_password,
+            args.rds_host,
+            args.rds_port,
+            args.max_work_mem_mb,
+            args.parallel_maintenance_workers,
+        ),
+        args.save_to_table_name,
+        args.job_posting_table_name,
+        args.job_posting_min,
+        args.interval_seconds,
+        args.change_threshold,
+        args.notify_channel,
+        args.poll_seconds,
+        args.retry_seconds,
+    )
+    health_server = build_health_server(scheduler, args.health_host, args.health_port)
+    threading.Thread(target=health_server.serve_forever, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+    try:
+        scheduler.serve_forever()
+    finally:
+        health_server.shutdown()
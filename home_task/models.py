@@ -1,7 +1,8 @@
 from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Column, Integer, String, Table, Float
+from sqlalchemy import Column, DateTime, Index, Integer, String, Table, Float, func
 from sqlalchemy.orm import registry
 
 mapper_registry = registry()
@@ -51,10 +52,17 @@ class JobPosting(Model):
         mapper_registry.metadata,
         Column("id", String, nullable=False, primary_key=True),
         Column("title", String, nullable=False),
-        Column("standard_job_id", String, nullable=False),
+        Column("standard_job_id", String, nullable=False, primary_key=True),
         Column("country_code", String, nullable=True),
         Column("days_to_hire", Integer, nullable=True),
+        Index(
+            "ix_job_posting_standard_job_id_country_code_days_to_hire",
+            "standard_job_id",
+            "country_code",
+            "days_to_hire",
+        ),
         schema="public",
+        postgresql_partition_by="HASH (standard_job_id)",
     )
 
     id: str
@@ -87,3 +95,26 @@ class DaysToHire(Model):
     max_days: float
     job_postings_number: int
     country_code: str | None
+
+
+@mapper_registry.mapped
+@dataclass
+class DaysToHireSnapshot(Model):
+    __table__ = Table(
+        "days_to_hire_snapshot",
+        mapper_registry.metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("table_name", String, nullable=False),
+        Column("rows_number", Integer, nullable=False),
+        Column(
+            "published_at",
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+        ),
+        schema="public",
+    )
+
+    table_name: str
+    rows_number: int
+    published_at: Optional[datetime] = None
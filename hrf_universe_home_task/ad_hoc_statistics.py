@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+STATEMENT_TIMEOUT_MS = 2000
+CACHE_MAX_SIZE = 1024
+CACHE_TTL_SECONDS = 300
+
+
+class BoundedTTLCache:
+    """Thread safe LRU cache whose entries also expire after ``ttl_seconds``."""
+
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return False, None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return False, None
+            self._items.move_to_end(key)
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self._ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+
+statistics_cache = BoundedTTLCache(CACHE_MAX_SIZE, CACHE_TTL_SECONDS)
+
+
+def _get_sql_statistics(with_country: bool) -> str:
+    # Filters match the leading columns of the
+    # (standard_job_id, country_code, days_to_hire) index, so base_data is an
+    # index only range scan within one partition.
+    country_filter = "AND country_code = :country_code" if with_country else ""
+    return f"""
+        WITH base_data AS (
+            SELECT days_to_hire
+            FROM job_posting
+            WHERE standard_job_id = :standard_job_id
+                {country_filter}
+                AND days_to_hire IS NOT NULL
+        ),
+        percentiles AS (
+            SELECT
+                PERCENTILE_CONT(:lower_percentile) WITHIN GROUP (ORDER BY days_to_hire) AS min_days,
+                PERCENTILE_CONT(:upper_percentile) WITHIN GROUP (ORDER BY days_to_hire) AS max_days
+            FROM base_data
+        )
+        SELECT
+            p.min_days,
+            AVG(b.days_to_hire)::INT AS avg_days,
+            p.max_days,
+            COUNT(b.days_to_hire) AS job_postings_number
+        FROM percentiles p
+        LEFT JOIN base_data b
+            ON b.days_to_hire > p.min_days AND b.days_to_hire < p.max_days
+        GROUP BY p.min_days, p.max_days
+    """
+
+
+def calculate_statistics(
+    session: Session,
+    standard_job_id: str,
+    country_code: Optional[str],
+    lower_percentile: float,
+    upper_percentile: float,
+    job_posting_min: int,
+) -> Optional[dict]:
+    """Calculate "days to hire" statistics for one standard job on demand.
+
+    Results, including missing statistics, are cached per parameters.
+    Returns None if there are no more than ``job_posting_min`` job postings
+    left after cutting the percentiles.
+    """
+    key = (
+        standard_job_id,
+        country_code,
+        lower_percentile,
+        upper_percentile,
+        job_posting_min,
+    )
+    is_cached, statistics = statistics_cache.get(key)
+    if is_cached:
+        return statistics
+
+    session.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(STATEMENT_TIMEOUT_MS)},
+    )
+    row = session.execute(
+        text(_get_sql_statistics(country_code is not None)),
+        {
+            "standard_job_id": standard_job_id,
+            "country_code": country_code,
+            "lower_percentile": lower_percentile,
+            "upper_percentile": upper_percentile,
+        },
+    ).first()
+
+    statistics = None
+    if row is not None and row.job_postings_number > job_posting_min:
+        statistics = {
+            "standard_job_id": standard_job_id,
+            "country_code": country_code,
+            "min_days": row.min_days,
+            "avg_days": row.avg_days,
+            "max_days": row.max_days,
+            "job_postings_number": row.job_postings_number,
+        }
+    statistics_cache.set(key, statistics)
+    return statistics
@@ -15,3 +15,37 @@ class DayToHireStatisticsQueryParams:
     ):
         self.standard_job_id = standard_job_id
         self.country_code = country_code
+
+
+class AdHocDayToHireStatisticsQueryParams(DayToHireStatisticsQueryParams):
+    def __init__(
+        self,
+        standard_job_id: str = Query(
+            description="Standard job id. UUID format.",
+        ),
+        country_code: Optional[str] = Query(
+            None,
+            description="Country code in ISO 3166-1 alpha-2 format. Request without this parameter means that need take global statistics.",
+        ),
+        lower_percentile: float = Query(
+            0.1,
+            ge=0,
+            le=1,
+            description="Percentile cut from the bottom of days to hire, used as minimum days.",
+        ),
+        upper_percentile: float = Query(
+            0.9,
+            ge=0,
+            le=1,
+            description="Percentile cut from the top of days to hire, used as maximum days.",
+        ),
+        job_posting_min: int = Query(
+            5,
+            ge=0,
+            description="Statistics are returned only if more job postings than this remain after cutting percentiles.",
+        ),
+    ):
+        super().__init__(standard_job_id, country_code)
+        self.lower_percentile = lower_percentile
+        self.upper_percentile = upper_percentile
+        self.job_posting_min = job_posting_min
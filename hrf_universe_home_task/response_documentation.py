@@ -22,3 +22,21 @@ DAYS_TO_HIRE_STATISTICS = {
         }
     },
 }
+
+AD_HOC_DAYS_TO_HIRE_STATISTICS = {
+    **DAYS_TO_HIRE_STATISTICS,
+    422: {
+        "content": {
+            "application/json": {
+                "example": "lower_percentile must be less than upper_percentile"
+            }
+        }
+    },
+    504: {
+        "content": {
+            "application/json": {
+                "example": "Statistics calculation took too long, try again later."
+            }
+        }
+    },
+}
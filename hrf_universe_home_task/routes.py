@@ -1,12 +1,21 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from psycopg2.errors import QueryCanceled
 
-from home_task.db import get_session
+from home_task.db import get_read_session
 from home_task.models import DaysToHire
 
-from hrf_universe_home_task.query_params import DayToHireStatisticsQueryParams
-from hrf_universe_home_task.response_documentation import DAYS_TO_HIRE_STATISTICS
+from hrf_universe_home_task.ad_hoc_statistics import calculate_statistics
+from hrf_universe_home_task.query_params import (
+    AdHocDayToHireStatisticsQueryParams,
+    DayToHireStatisticsQueryParams,
+)
+from hrf_universe_home_task.response_documentation import (
+    AD_HOC_DAYS_TO_HIRE_STATISTICS,
+    DAYS_TO_HIRE_STATISTICS,
+)
 
 
 router = APIRouter(prefix="/stats")
@@ -40,7 +49,7 @@ def get_days_to_hire_stats(
         HTTPException: If statistics are not found or on server error
     """
 
-    with get_session() as session:
+    with get_read_session() as session:
         try:
             query = select(DaysToHire).where(
                 DaysToHire.standard_job_id == params.standard_job_id,
@@ -58,3 +67,73 @@ def get_days_to_hire_stats(
             raise HTTPException(status_code=404, detail="Statistics not found")
 
         return result[0]
+
+
+@router.get(
+    "/days_to_hire/ad_hoc",
+    description='Calculate "days to hire" statistics on demand with custom percentiles and minimum job postings number.',
+    tags=[
+        "Statistic",
+    ],
+    responses=AD_HOC_DAYS_TO_HIRE_STATISTICS,
+)
+def get_ad_hoc_days_to_hire_stats(
+    params: AdHocDayToHireStatisticsQueryParams = Depends(),
+) -> dict:
+    """Calculate hiring statistics for a specific job and optionally a specific country
+    from job postings, instead of reading precalculated statistics.
+
+    Args:
+        standard_job_id: ID of the standard job to get statistics for
+        country_code: Optional country code to filter statistics by
+        lower_percentile: Percentile used as minimum days, lower values are cut
+        upper_percentile: Percentile used as maximum days, higher values are cut
+        job_posting_min: Minimum number of job postings left after cutting
+
+    Returns:
+        Dictionary containing min, max, average days to hire and number of job postings
+
+    Raises:
+        HTTPException: If parameters are invalid, statistics are not found,
+            calculation timed out or on server error
+    """
+
+    if params.lower_percentile >= params.upper_percentile:
+        raise HTTPException(
+            status_code=422,
+            detail="lower_percentile must be less than upper_percentile",
+        )
+
+    with get_read_session() as session:
+        try:
+            result = calculate_statistics(
+                session,
+                params.standard_job_id,
+                params.country_code,
+                params.lower_percentile,
+                params.upper_percentile,
+                params.job_posting_min,
+            )
+        except OperationalError as e:
+            if isinstance(e.orig, QueryCanceled):
+                logger.warning(e)
+                raise HTTPException(
+                    status_code=504,
+                    detail="Statistics calculation took too long, try again later.",
+                )
+            logger.error(e, exc_info=True)
+            raise HTTPException(
+                status_code=504,
+                detail="Oooops...Smth go wrong, our developers already working on this issue.",
+            )
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            raise HTTPException(
+                status_code=504,
+                detail="Oooops...Smth go wrong, our developers already working on this issue.",
+            )
+
+        if not result:
+            raise HTTPException(status_code=404, detail="Statistics not found")
+
+        return result
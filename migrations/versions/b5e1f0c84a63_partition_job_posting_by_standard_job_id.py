@@ -0,0 +1,225 @@
+"""partition job_posting by standard_job_id
+
+Revision ID: b5e1f0c84a63
+Revises: 7c3d9a1e5b24
+Create Date: 2026-10-19 11:03:17.529841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1f0c84a63'
+down_revision = '7c3d9a1e5b24'
+branch_labels = None
+depends_on = None
+
+PARTITIONS_NUMBER = 16
+COPY_BATCH_SIZE = 50000
+
+
+def _create_partitioned_table() -> None:
+    op.execute(
+        """
+        CREATE TABLE public.job_posting_partitioned (
+            id VARCHAR NOT NULL,
+            title VARCHAR NOT NULL,
+            standard_job_id VARCHAR NOT NULL,
+            country_code VARCHAR,
+            days_to_hire INTEGER,
+            CONSTRAINT job_posting_partitioned_pkey PRIMARY KEY (id, standard_job_id)
+        ) PARTITION BY HASH (standard_job_id);
+        """
+    )
+    for remainder in range(PARTITIONS_NUMBER):
+        op.execute(
+            f"""
+            CREATE TABLE public.job_posting_p{remainder}
+            PARTITION OF public.job_posting_partitioned
+            FOR VALUES WITH (MODULUS {PARTITIONS_NUMBER}, REMAINDER {remainder});
+            """
+        )
+
+
+def _create_mirror_trigger() -> None:
+    # Keeps the partitioned copy up to date with writes made during the backfill
+    # and logs the keys they touched, so only those need reconciling at the swap.
+    op.execute(
+        """
+        CREATE TABLE public.job_posting_partitioned_changes (
+            id VARCHAR NOT NULL,
+            standard_job_id VARCHAR NOT NULL
+        );
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION public.job_posting_mirror() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO public.job_posting_partitioned_changes
+                VALUES (OLD.id, OLD.standard_job_id);
+                DELETE FROM public.job_posting_partitioned
+                WHERE id = OLD.id AND standard_job_id = OLD.standard_job_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO public.job_posting_partitioned_changes
+                VALUES (NEW.id, NEW.standard_job_id);
+                INSERT INTO public.job_posting_partitioned
+                VALUES (NEW.id, NEW.title, NEW.standard_job_id, NEW.country_code, NEW.days_to_hire)
+                ON CONFLICT (id, standard_job_id) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    country_code = EXCLUDED.country_code,
+                    days_to_hire = EXCLUDED.days_to_hire;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER job_posting_mirror
+        AFTER INSERT OR UPDATE OR DELETE ON public.job_posting
+        FOR EACH ROW EXECUTE FUNCTION public.job_posting_mirror();
+        """
+    )
+
+
+def _backfill() -> None:
+    # Every batch commits on its own, so writers are never blocked for long.
+    bind = op.get_bind()
+    last_id = ""
+    while True:
+        last_id = bind.execute(
+            sa.text(
+                """
+                WITH batch AS (
+                    SELECT id, title, standard_job_id, country_code, days_to_hire
+                    FROM public.job_posting
+                    WHERE id > :last_id
+                    ORDER BY id
+                    LIMIT :batch_size
+                ),
+                copied AS (
+                    INSERT INTO public.job_posting_partitioned
+                    SELECT * FROM batch
+                    ON CONFLICT (id, standard_job_id) DO NOTHING
+                )
+                SELECT MAX(id) FROM batch
+                """
+            ),
+            {"last_id": last_id, "batch_size": COPY_BATCH_SIZE},
+        ).scalar()
+        if last_id is None:
+            break
+
+
+def _drop_copy() -> None:
+    # Leftovers of an interrupted upgrade, so the migration can be re-run.
+    op.execute("DROP TRIGGER IF EXISTS job_posting_mirror ON public.job_posting;")
+    op.execute("DROP FUNCTION IF EXISTS public.job_posting_mirror();")
+    op.execute("DROP TABLE IF EXISTS public.job_posting_partitioned;")
+    op.execute("DROP TABLE IF EXISTS public.job_posting_partitioned_changes;")
+
+
+def _reconcile() -> None:
+    # A backfill batch reads a snapshot taken when it starts, so it can copy a
+    # row that a concurrent writer has deleted or moved to another standard
+    # job in the meantime. Rows of every logged key are copied again from
+    # job_posting, writes made meanwhile log their keys for the next pass.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE IF NOT EXISTS job_posting_reconciled_keys (
+            id VARCHAR NOT NULL,
+            standard_job_id VARCHAR NOT NULL
+        );
+        """
+    )
+    op.execute("TRUNCATE job_posting_reconciled_keys;")
+    op.execute(
+        """
+        WITH logged AS (
+            DELETE FROM public.job_posting_partitioned_changes
+            RETURNING id, standard_job_id
+        )
+        INSERT INTO job_posting_reconciled_keys
+        SELECT DISTINCT id, standard_job_id FROM logged;
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM public.job_posting_partitioned p
+        USING job_posting_reconciled_keys k
+        WHERE p.id = k.id AND p.standard_job_id = k.standard_job_id;
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO public.job_posting_partitioned
+        SELECT o.id, o.title, o.standard_job_id, o.country_code, o.days_to_hire
+        FROM public.job_posting o
+        JOIN job_posting_reconciled_keys k
+            ON o.id = k.id AND o.standard_job_id = k.standard_job_id
+        ON CONFLICT (id, standard_job_id) DO UPDATE SET
+            title = EXCLUDED.title,
+            country_code = EXCLUDED.country_code,
+            days_to_hire = EXCLUDED.days_to_hire;
+        """
+    )
+
+
+def _swap() -> None:
+    # Readers keep working, writers wait until the swap commits.
+    op.execute("LOCK TABLE public.job_posting IN EXCLUSIVE MODE;")
+    _reconcile()
+    op.execute("DROP TRIGGER job_posting_mirror ON public.job_posting;")
+    op.execute("DROP FUNCTION public.job_posting_mirror();")
+    op.execute("DROP TABLE public.job_posting_partitioned_changes;")
+    op.execute("DROP TABLE job_posting_reconciled_keys;")
+    op.execute("DROP TABLE public.job_posting;")
+    op.execute("ALTER TABLE public.job_posting_partitioned RENAME TO job_posting;")
+    op.execute(
+        "ALTER TABLE public.job_posting "
+        "RENAME CONSTRAINT job_posting_partitioned_pkey TO job_posting_pkey;"
+    )
+
+
+def upgrade() -> None:
+    _drop_copy()
+    _create_partitioned_table()
+    _create_mirror_trigger()
+    with op.get_context().autocommit_block():
+        try:
+            _backfill()
+            # Without the lock and committed statement by statement, so writers
+            # are not blocked and the pass under the lock stays small.
+            _reconcile()
+        except Exception:
+            # Do not leave the trigger doubling every write to job_posting.
+            _drop_copy()
+            raise
+    _swap()
+
+
+def downgrade() -> None:
+    op.create_table(
+        "job_posting_unpartitioned",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("standard_job_id", sa.String(), nullable=False),
+        sa.Column("country_code", sa.String(), nullable=True),
+        sa.Column("days_to_hire", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name="job_posting_unpartitioned_pkey"),
+        schema="public",
+    )
+    op.execute(
+        "INSERT INTO public.job_posting_unpartitioned SELECT * FROM public.job_posting;"
+    )
+    op.execute("DROP TABLE public.job_posting;")
+    op.execute("ALTER TABLE public.job_posting_unpartitioned RENAME TO job_posting;")
+    op.execute(
+        "ALTER TABLE public.job_posting "
+        "RENAME CONSTRAINT job_posting_unpartitioned_pkey TO job_posting_pkey;"
+    )
@@ -0,0 +1,83 @@
+"""add job_posting (standard_job_id, country_code, days_to_hire) index
+
+Revision ID: e8a4c2d7f913
+Revises: b5e1f0c84a63
+Create Date: 2026-10-19 12:21:48.117305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a4c2d7f913'
+down_revision = 'b5e1f0c84a63'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_job_posting_standard_job_id_country_code_days_to_hire"
+INDEX_COLUMNS = "(standard_job_id, country_code, days_to_hire)"
+# Postgres truncates identifiers longer than 63 characters.
+PARTITION_INDEX_SUFFIX = "sjid_cc_dth_idx"
+
+
+def _get_partition_names() -> list[str]:
+    return [
+        row[0]
+        for row in op.get_bind().execute(
+            sa.text(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'public.job_posting'::regclass
+                ORDER BY c.relname
+                """
+            )
+        )
+    ]
+
+
+def _is_index_invalid(index_name: str) -> bool:
+    return bool(
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT NOT indisvalid FROM pg_index "
+                "WHERE indexrelid = to_regclass(:index_name)"
+            ),
+            {"index_name": f"public.{index_name}"},
+        )
+        .scalar()
+    )
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY is not supported on a partitioned table, so the
+    # parent index is created invalid and every partition index is built
+    # concurrently and attached to it. The parent turns valid once all are attached.
+    # Every step can be re-run after a failed concurrent build.
+    partition_names = _get_partition_names()
+    op.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        f"ON ONLY public.job_posting {INDEX_COLUMNS};"
+    )
+    with op.get_context().autocommit_block():
+        for partition_name in partition_names:
+            partition_index_name = f"{partition_name}_{PARTITION_INDEX_SUFFIX}"
+            # A failed concurrent build leaves an invalid index behind, rebuild it.
+            if _is_index_invalid(partition_index_name):
+                op.execute(f"DROP INDEX CONCURRENTLY public.{partition_index_name};")
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index_name} "
+                f"ON public.{partition_name} {INDEX_COLUMNS};"
+            )
+    for partition_name in partition_names:
+        op.execute(
+            f"ALTER INDEX public.{INDEX_NAME} "
+            f"ATTACH PARTITION public.{partition_name}_{PARTITION_INDEX_SUFFIX};"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="job_posting", schema="public")